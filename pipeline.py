@@ -4,48 +4,232 @@ Creative Automation Pipeline for Social Ad Campaigns
 Uses Google Gemini 2.5 Flash Image model (recommended for image generation)
 """
 
+import asyncio
+import concurrent.futures
+import copy
+import functools
+import hashlib
+import importlib.util
+import tempfile
 import json
+import logging
+import logging.handlers
 import os
 import argparse
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, List, Optional, Tuple
 import sys
+from io import BytesIO
 from dotenv import load_dotenv
 
+if TYPE_CHECKING:
+    from google.genai import types
+
 # Load environment variables from .env file
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Heavy dependencies are imported on first use to keep CLI startup fast
+_GENAI = None
+_PIL = None
+
+
+def _exit_missing_packages() -> None:
+    """Report missing required packages and exit"""
+    logger.error("Error: Required packages not installed.")
+    logger.error("Please run: pip install -r requirements.txt")
+    sys.exit(1)
+
+
+def _load_genai():
+    """Import the Gemini SDK and its HTTP client, returning (genai, types, httpx)"""
+    global _GENAI
+    if _GENAI is None:
+        try:
+            import httpx
+            from google import genai
+            from google.genai import types
+        except ImportError:
+            _exit_missing_packages()
+        _GENAI = (genai, types, httpx)
+    return _GENAI
+
+
+def _load_pil():
+    """Import Pillow, returning (Image, ImageOps)"""
+    global _PIL
+    if _PIL is None:
+        try:
+            from PIL import Image, ImageOps
+        except ImportError:
+            _exit_missing_packages()
+        _PIL = (Image, ImageOps)
+    return _PIL
+
+
 try:
-    from google import genai
-    from google.genai import types
-    from PIL import Image
-    from io import BytesIO
+    import yaml
 except ImportError:
-    print("Error: Required packages not installed.")
-    print("Please run: pip install -r requirements.txt")
-    sys.exit(1)
+    yaml = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Batch job states after which polling stops
+BATCH_TERMINAL_STATES = {
+    'JOB_STATE_SUCCEEDED',
+    'JOB_STATE_FAILED',
+    'JOB_STATE_CANCELLED',
+    'JOB_STATE_EXPIRED'
+}
+
+# Model family that accepts image_config (older models such as gemini-2.0-flash-exp reject it)
+IMAGE_CONFIG_MODEL_PREFIX = 'gemini-2.5-flash-image'
+
+# Aspect ratio generated once per variant when deriving crops
+BASE_ASPECT_RATIO = '1x1'
+
+# Encoder settings per output format: fast PNG (zlib level 1) or SIMD-accelerated WebP
+IMAGE_SAVE_OPTIONS = {
+    'png': {'format': 'PNG', 'compress_level': 1, 'optimize': False},
+    'webp': {'format': 'WEBP', 'quality': 90, 'method': 4}
+}
+
+# Variation cues for different variants
+VARIANT_STYLES = [
+    "lifestyle shot with natural lighting",
+    "close-up product detail with premium aesthetic",
+    "environmental context showing product in use"
+]
+
+
+@functools.lru_cache(maxsize=32)
+def _load_brief_cached(path: str, mtime: float) -> Dict:
+    """Parse a campaign brief; cached by path and modification time"""
+    brief_file = Path(path)
+
+    if brief_file.suffix == '.json':
+        data = brief_file.read_bytes()
+        return orjson.loads(data) if orjson is not None else json.loads(data)
+    elif brief_file.suffix in ['.yaml', '.yml']:
+        if yaml is None:
+            raise ImportError("PyYAML is required for YAML briefs. Run: pip install PyYAML")
+        with open(brief_file, 'r') as f:
+            return yaml.safe_load(f)
+    else:
+        raise ValueError("Brief must be JSON or YAML format")
+
+
+def _decode_resize_save(
+    image_data: bytes,
+    target_size: Tuple[int, int],
+    output_path: Path,
+    save_options: Dict
+) -> None:
+    """Decode, resize and encode an image; runs in a worker process to bypass the GIL"""
+    Image, _ = _load_pil()
+    image = Image.open(BytesIO(image_data))
+
+    # Resize to target aspect ratio (skipped when the model already matches)
+    if image.size != target_size:
+        # reducing_gap enables Pillow's box pre-reduction before Lanczos on downsamples
+        image = image.resize(target_size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+    image.save(output_path, **save_options)
+
+
+def _decode_crop_save(
+    image_data: bytes,
+    outputs: List[Tuple[Tuple[int, int], Path]],
+    save_options: Dict
+) -> None:
+    """Decode an image once and save a center crop for each (target_size, output_path)"""
+    Image, ImageOps = _load_pil()
+    image = Image.open(BytesIO(image_data))
+    image.load()
+
+    for target_size, output_path in outputs:
+        cropped = ImageOps.fit(image, target_size, Image.Resampling.LANCZOS, centering=(0.5, 0.5))
+        cropped.save(output_path, **save_options)
 
 
 class CreativeAutomationPipeline:
     """Main pipeline class for automating creative asset generation"""
 
-    def __init__(self, api_key: Optional[str] = None, model: str = 'gemini-2.5-flash-image'):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model: str = 'gemini-2.5-flash-image',
+        max_concurrency: int = 4,
+        use_cache: bool = True,
+        image_format: str = 'png',
+        verbose: bool = False,
+        derive_crops: bool = False
+    ):
         """
         Initialize the pipeline with Google Gemini API
 
         Args:
             api_key: Google Gemini API key (defaults to GEMINI_API_KEY env var)
             model: Model name (default: gemini-2.5-flash-image)
+            max_concurrency: Maximum number of in-flight Gemini requests
+            use_cache: Reuse cached images for identical prompts instead of calling the API
+            image_format: Output image format ('png' or 'webp')
+            verbose: Print any text the model returns alongside images
+            derive_crops: Generate one square image per variant and center-crop it to
+                every aspect ratio instead of generating each ratio separately
         """
         self.api_key = api_key or os.environ.get('GEMINI_API_KEY')
         if not self.api_key:
             raise ValueError("GEMINI_API_KEY not found. Set environment variable or pass as argument.")
-
-        self.client = genai.Client(api_key=self.api_key)
+        if image_format not in IMAGE_SAVE_OPTIONS:
+            raise ValueError(f"Unsupported image format: {image_format}")
+
+        self.max_concurrency = max(1, max_concurrency)
+        genai, self._types, httpx = _load_genai()
+
+        # Pillow is only imported in the worker processes; fail before any paid API call
+        if importlib.util.find_spec('PIL') is None:
+            _exit_missing_packages()
+
+        # Share pooled keep-alive HTTP/2 connections across all API calls, sized so
+        # every request the semaphore lets through gets a connection without queuing.
+        # Only the async client is configured since every call goes through client.aio.
+        # These httpx options only apply to the default httpx transport: with
+        # google-genai[aiohttp] installed, the SDK drops arguments aiohttp doesn't accept.
+        pool_size = max(self.max_concurrency, 16)
+        self.http_options = self._types.HttpOptions(
+            async_client_args={
+                'http2': True,
+                'limits': httpx.Limits(
+                    max_connections=pool_size,
+                    max_keepalive_connections=pool_size,
+                    keepalive_expiry=60
+                )
+            }
+        )
+        self.client = genai.Client(api_key=self.api_key, http_options=self.http_options)
         self.model = model
         self.output_dir = Path('generated_assets')
         self.output_dir.mkdir(exist_ok=True)
+        self.use_cache = use_cache
+        self.image_format = image_format
+        self.verbose = verbose
+        self.derive_crops = derive_crops
+
+        # Timestamp shared by every asset of a run; refreshed when a run starts
+        self._run_ts = datetime.now().strftime('%Y%m%d_%H%M%S')
+        self._cache_dir = self.output_dir / '.cache'
+        self._read_cache = use_cache
+
+        # Worker processes for CPU-bound decode/resize/encode
+        self._pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=min(os.cpu_count() or 1, 4)
+        )
 
         # Aspect ratios for different platforms
         self.aspect_ratios = {
@@ -61,7 +245,7 @@ class CreativeAutomationPipeline:
             '16x9': '16:9'
         }
 
-        print(f"✓ Initialized with model: {self.model}")
+        logger.info("✓ Initialized with model: %s", self.model)
 
     def load_campaign_brief(self, brief_path: str) -> Dict:
         """Load campaign brief from JSON or YAML file"""
@@ -70,46 +254,59 @@ class CreativeAutomationPipeline:
         if not brief_file.exists():
             raise FileNotFoundError(f"Campaign brief not found: {brief_path}")
 
-        with open(brief_file, 'r') as f:
-            if brief_file.suffix == '.json':
-                return json.load(f)
-            elif brief_file.suffix in ['.yaml', '.yml']:
-                import yaml
-                return yaml.safe_load(f)
-            else:
-                raise ValueError("Brief must be JSON or YAML format")
+        # Copy so callers can't mutate the cached brief
+        brief = _load_brief_cached(str(brief_file.resolve()), brief_file.stat().st_mtime)
+        return copy.deepcopy(brief)
 
-    def check_existing_assets(self, product: str, aspect_ratio: str) -> Optional[Path]:
+    def _scan_existing_assets(self, product: str) -> Dict[str, List[Path]]:
+        """Map each aspect ratio directory of a product to its existing assets"""
+        existing = {}
+        suffix = f'.{self.image_format}'
+        try:
+            with os.scandir(self.output_dir / product) as ratio_dirs:
+                for ratio_dir in ratio_dirs:
+                    if not ratio_dir.is_dir():
+                        continue
+                    with os.scandir(ratio_dir.path) as entries:
+                        existing[ratio_dir.name] = [
+                            Path(entry.path) for entry in entries
+                            if entry.name.endswith(suffix) and entry.is_file()
+                        ]
+        except FileNotFoundError:
+            pass
+        return existing
+
+    def check_existing_assets(
+        self,
+        product: str,
+        aspect_ratio: str,
+        existing: Optional[Dict[str, List[Path]]] = None
+    ) -> Optional[Path]:
         """Check if assets already exist for product and aspect ratio"""
-        asset_path = self.output_dir / product / aspect_ratio
-        if asset_path.exists() and list(asset_path.glob('*.png')):
+        if existing is None:
+            existing = self._scan_existing_assets(product)
+        if existing.get(aspect_ratio):
             display_ratio = self.aspect_ratio_display.get(aspect_ratio, aspect_ratio)
-            print(f"✓ Found existing assets for {product} ({display_ratio})")
-            return asset_path
+            logger.info("✓ Found existing assets for %s (%s)", product, display_ratio)
+            return self.output_dir / product / aspect_ratio
         return None
 
-    def generate_image_prompt(self, brief: Dict, aspect_ratio: str, variant_num: int) -> str:
-        """Generate detailed prompt for image generation"""
-        product = brief.get('product', '').replace('_', ' ').title()
-        audience = brief.get('target_audience', 'general audience')
-        message = brief.get('campaign_message', '')
-        region = brief.get('target_region', 'global')
-        features = brief.get('key_features', [])
-
-        display_ratio = self.aspect_ratio_display.get(aspect_ratio, aspect_ratio)
+    def _prepare_prompt_template(self, brief: Dict) -> str:
+        """Build the brief-specific prompt once, leaving {style_cue} and {display_ratio} open"""
+        def escape(value) -> str:
+            # Brief values may be None or numbers (e.g. empty or numeric YAML fields)
+            return str(value).replace('{', '{{').replace('}', '}}')
 
-        # Create variation cues for different variants
-        variant_styles = [
-            "lifestyle shot with natural lighting",
-            "close-up product detail with premium aesthetic",
-            "environmental context showing product in use"
-        ]
-        style_cue = variant_styles[(variant_num - 1) % len(variant_styles)]
+        product = escape(brief.get('product', '').replace('_', ' ').title())
+        audience = escape(brief.get('target_audience', 'general audience'))
+        message = escape(brief.get('campaign_message', ''))
+        region = escape(brief.get('target_region', 'global'))
+        features = [escape(feature) for feature in brief.get('key_features') or []]
 
         # Build contextual prompt
-        prompt = f"""Create a professional marketing photograph for {product}.
+        return f"""Create a professional marketing photograph for {product}.
 
-Style: {style_cue}
+Style: {{style_cue}}
 Target audience: {audience}
 Message: {message}
 Market: {region}
@@ -120,68 +317,282 @@ Visual requirements:
 - Clean, modern composition
 - Brand-appropriate colors and aesthetic
 - High-quality, photo-realistic rendering
-- Suitable for {display_ratio} social media format
+- Suitable for {{display_ratio}} social media format
 
 {f'Key features to highlight: {", ".join(features[:2])}' if features else ''}
 
 Create an eye-catching, professional marketing image that would perform well in social media advertising."""
 
-        return prompt
+    def generate_image_prompt(
+        self,
+        brief: Dict,
+        aspect_ratio: str,
+        variant_num: int,
+        prompt_template: Optional[str] = None
+    ) -> str:
+        """Generate detailed prompt for image generation"""
+        if prompt_template is None:
+            prompt_template = self._prepare_prompt_template(brief)
+
+        # Variation cue for this variant
+        style_cue = VARIANT_STYLES[(variant_num - 1) % len(VARIANT_STYLES)]
+        display_ratio = self.aspect_ratio_display.get(aspect_ratio, aspect_ratio)
+
+        return prompt_template.format(style_cue=style_cue, display_ratio=display_ratio)
+
+    def _cache_path(self, prompt: str, aspect_ratio: str, variant_num: int) -> Path:
+        """Path of the cached image keyed by model, aspect ratio, variant and prompt"""
+        # Variants past len(VARIANT_STYLES) share a prompt, so the variant keeps them distinct
+        key = hashlib.sha256(
+            f"{self.model}|{aspect_ratio}|{variant_num}|{prompt}".encode()
+        ).hexdigest()
+        return self._cache_dir / f"{key}.png"
+
+    def _load_cached_image(self, prompt: str, aspect_ratio: str, variant_num: int) -> Optional[bytes]:
+        """Return cached image bytes for a prompt, if any"""
+        if not self._read_cache:
+            return None
+        cache_path = self._cache_path(prompt, aspect_ratio, variant_num)
+        if cache_path.exists():
+            return cache_path.read_bytes()
+        return None
+
+    def _store_cached_image(
+        self,
+        prompt: str,
+        aspect_ratio: str,
+        variant_num: int,
+        image_data: bytes
+    ) -> None:
+        """Persist generated image bytes so later runs can reuse them"""
+        if not self.use_cache:
+            return
+        self._cache_dir.mkdir(parents=True, exist_ok=True)
+
+        # Write to a temp file and rename so an interrupted write never leaves a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self._cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(image_data)
+            os.replace(tmp_path, self._cache_path(prompt, aspect_ratio, variant_num))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _discard_cached_image(self, prompt: str, aspect_ratio: str, variant_num: int) -> None:
+        """Remove a cache entry that could not be decoded"""
+        self._cache_path(prompt, aspect_ratio, variant_num).unlink(missing_ok=True)
+
+    def _generation_config(self, aspect_ratio: str) -> Optional['types.GenerateContentConfig']:
+        """Ask the model to render natively at the requested aspect ratio, if it supports that"""
+        if not self.model.startswith(IMAGE_CONFIG_MODEL_PREFIX):
+            return None
+
+        display_ratio = self.aspect_ratio_display.get(aspect_ratio, aspect_ratio)
+        return self._types.GenerateContentConfig(
+            image_config=self._types.ImageConfig(aspect_ratio=display_ratio)
+        )
+
+    def _find_image_data(self, response) -> Optional[bytes]:
+        """Return the first image in a Gemini response (or stream chunk), if any"""
+        if not response.candidates or response.candidates[0].content is None:
+            return None
+
+        for part in response.candidates[0].content.parts or []:
+            if part.inline_data is not None:
+                return part.inline_data.data
+            elif self.verbose and part.text is not None:
+                logger.info("  Response text: %.150s...", part.text)
+        return None
 
-    def generate_creative_asset(
+    def extract_image_data(self, response) -> bytes:
+        """Return the raw image bytes from a Gemini response"""
+        image_data = self._find_image_data(response)
+        if image_data is None:
+            raise Exception(f"No image data in response from {self.model}")
+        return image_data
+
+    async def _stream_image_data(self, prompt: str, aspect_ratio: str) -> bytes:
+        """Stream a generation and return as soon as the first image arrives"""
+        stream = await self.client.aio.models.generate_content_stream(
+            model=self.model,
+            contents=[prompt],
+            config=self._generation_config(aspect_ratio)
+        )
+        try:
+            async for chunk in stream:
+                image_data = self._find_image_data(chunk)
+                if image_data is not None:
+                    return image_data
+        finally:
+            await stream.aclose()
+
+        raise Exception(f"No image data in response from {self.model}")
+
+    def _asset_path(self, product: str, aspect_ratio: str, variant_num: int) -> Path:
+        """Output path for a variant in the current run"""
+        filename = f"{product}_{aspect_ratio}_v{variant_num}_{self._run_ts}.{self.image_format}"
+        return self.output_dir / product / aspect_ratio / filename
+
+    async def save_asset(
+        self,
+        image_data: bytes,
+        product: str,
+        aspect_ratio: str,
+        variant_num: int
+    ) -> Path:
+        """Resize generated image bytes to the target aspect ratio and save them"""
+        target_size = self.aspect_ratios.get(aspect_ratio, (1024, 1024))
+        output_path = self._asset_path(product, aspect_ratio, variant_num)
+
+        # Image processing is CPU-bound, so hand it to the process pool
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            self._pool,
+            _decode_resize_save,
+            image_data,
+            target_size,
+            output_path,
+            IMAGE_SAVE_OPTIONS[self.image_format]
+        )
+        logger.info("✓ Saved: %s", output_path)
+        return output_path
+
+    async def save_cropped_assets(
+        self,
+        image_data: bytes,
+        product: str,
+        aspect_ratios: List[str],
+        variant_num: int
+    ) -> List[Path]:
+        """Center-crop one generated image to each aspect ratio and save them"""
+        outputs = [
+            (self.aspect_ratios.get(aspect_ratio, (1024, 1024)),
+             self._asset_path(product, aspect_ratio, variant_num))
+            for aspect_ratio in aspect_ratios
+        ]
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            self._pool,
+            _decode_crop_save,
+            image_data,
+            outputs,
+            IMAGE_SAVE_OPTIONS[self.image_format]
+        )
+
+        output_paths = [output_path for _, output_path in outputs]
+        for output_path in output_paths:
+            logger.info("✓ Saved: %s", output_path)
+        return output_paths
+
+    async def _collect_saves(
+        self,
+        saves: List[Tuple[str, int, Awaitable[Path]]],
+        results: Dict[str, List[Path]]
+    ) -> None:
+        """Run pending saves concurrently and record their paths by display ratio"""
+        outcomes = await asyncio.gather(*(save for _, _, save in saves), return_exceptions=True)
+        for (display_ratio, i, _), outcome in zip(saves, outcomes):
+            if isinstance(outcome, Exception):
+                logger.warning("Failed to generate %s variant %d: %s", display_ratio, i, outcome)
+            else:
+                results[display_ratio].append(outcome)
+
+    def close(self) -> None:
+        """Shut down the image processing worker pool"""
+        self._pool.shutdown()
+
+    async def _generate_and_save(
+        self,
+        prompt: str,
+        aspect_ratio: str,
+        variant_num: int,
+        save: Callable[[bytes], Awaitable],
+        semaphore: Optional[asyncio.Semaphore] = None
+    ):
+        """Save image bytes for a prompt, from the cache or a fresh API call"""
+        # Reuse a previous run's response for the same prompt and variant
+        image_data = self._load_cached_image(prompt, aspect_ratio, variant_num)
+        if image_data is not None:
+            logger.info("✓ Using cached image from a previous run")
+            try:
+                return await save(image_data)
+            except Exception as e:
+                logger.warning("Discarding unreadable cached image: %s", e)
+                self._discard_cached_image(prompt, aspect_ratio, variant_num)
+
+        # Call Gemini API for image generation
+        # gemini-2.5-flash-image handles image generation natively
+        semaphore = semaphore or asyncio.Semaphore(self.max_concurrency)
+        async with semaphore:
+            image_data = await self._stream_image_data(prompt, aspect_ratio)
+
+        self._store_cached_image(prompt, aspect_ratio, variant_num, image_data)
+        return await save(image_data)
+
+    async def generate_creative_asset(
         self, 
         brief: Dict, 
         aspect_ratio: str,
-        variant_num: int = 1
+        variant_num: int = 1,
+        semaphore: Optional[asyncio.Semaphore] = None,
+        prompt_template: Optional[str] = None
     ) -> Path:
         """Generate a single creative asset using Gemini API"""
         product = brief.get('product', 'unknown_product')
 
-        # Create output directory structure
-        product_dir = self.output_dir / product / aspect_ratio
-        product_dir.mkdir(parents=True, exist_ok=True)
-
         # Generate prompt
-        prompt = self.generate_image_prompt(brief, aspect_ratio, variant_num)
+        prompt = self.generate_image_prompt(brief, aspect_ratio, variant_num, prompt_template)
 
         display_ratio = self.aspect_ratio_display.get(aspect_ratio, aspect_ratio)
-        print(f"\nGenerating {display_ratio} asset for {product} (variant {variant_num})...")
+        logger.info("\nGenerating %s asset for %s (variant %d)...", display_ratio, product, variant_num)
 
         try:
-            # Call Gemini API for image generation
-            # gemini-2.5-flash-image handles image generation natively
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=[prompt]
+            return await self._generate_and_save(
+                prompt,
+                aspect_ratio,
+                variant_num,
+                lambda image_data: self.save_asset(image_data, product, aspect_ratio, variant_num),
+                semaphore
             )
 
-            # Extract and save image
-            image_found = False
-            for part in response.candidates[0].content.parts:
-                if part.inline_data is not None:
-                    image = Image.open(BytesIO(part.inline_data.data))
+        except Exception as e:
+            logger.error("✗ Error generating asset: %s", e)
+            raise
 
-                    # Resize to target aspect ratio
-                    target_size = self.aspect_ratios.get(aspect_ratio, (1024, 1024))
-                    image = image.resize(target_size, Image.Resampling.LANCZOS)
+    async def generate_cropped_assets(
+        self,
+        brief: Dict,
+        aspect_ratios: List[str],
+        variant_num: int = 1,
+        semaphore: Optional[asyncio.Semaphore] = None,
+        prompt_template: Optional[str] = None
+    ) -> List[Path]:
+        """Generate one square image for a variant and crop it to each aspect ratio"""
+        product = brief.get('product', 'unknown_product')
 
-                    # Save image
-                    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                    filename = f"{product}_{aspect_ratio}_v{variant_num}_{timestamp}.png"
-                    output_path = product_dir / filename
+        # Generate prompt for the square base image
+        prompt = self.generate_image_prompt(brief, BASE_ASPECT_RATIO, variant_num, prompt_template)
 
-                    image.save(output_path)
-                    print(f"✓ Saved: {output_path}")
-                    image_found = True
-                    return output_path
-                elif part.text is not None:
-                    print(f"  Response text: {part.text[:150]}...")
+        display_ratios = ', '.join(
+            self.aspect_ratio_display.get(aspect_ratio, aspect_ratio) for aspect_ratio in aspect_ratios
+        )
+        logger.info("\nGenerating %s assets for %s (variant %d)...", display_ratios, product, variant_num)
 
-            if not image_found:
-                raise Exception(f"No image data in response from {self.model}")
+        try:
+            return await self._generate_and_save(
+                prompt,
+                BASE_ASPECT_RATIO,
+                variant_num,
+                lambda image_data: self.save_cropped_assets(
+                    image_data, product, aspect_ratios, variant_num
+                ),
+                semaphore
+            )
 
         except Exception as e:
-            print(f"✗ Error generating asset: {str(e)}")
+            logger.error("✗ Error generating asset: %s", e)
             raise
 
     def generate_campaign_message(self, brief: Dict, locale: str = 'en') -> str:
@@ -191,74 +602,236 @@ Create an eye-catching, professional marketing image that would perform well in
         if locale == 'en':
             return base_message
 
-        print(f"Note: Localization for '{locale}' not yet implemented. Using English.")
+        logger.info("Note: Localization for '%s' not yet implemented. Using English.", locale)
         return base_message
 
-    def run_pipeline(
-        self, 
-        brief_path: str, 
-        num_variants: int = 3,
-        skip_existing: bool = True
-    ) -> Dict[str, List[Path]]:
-        """Run complete pipeline for campaign brief"""
-        print("="*60)
-        print("Creative Automation Pipeline - Starting")
-        print("="*60)
+    def _plan_pipeline(
+        self,
+        brief_path: str,
+        num_variants: int,
+        skip_existing: bool
+    ) -> Tuple[Dict, Dict[str, List[Path]], List[Tuple[str, str, int]]]:
+        """Load the brief and collect the (display_ratio, aspect_ratio, variant) jobs to run"""
+        logger.info("="*60)
+        logger.info("Creative Automation Pipeline - Starting")
+        logger.info("="*60)
+
+        self._run_ts = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+        # --no-skip asks for fresh images, so only reuse cached ones when skipping
+        self._read_cache = self.use_cache and skip_existing
 
         # Load campaign brief
         brief = self.load_campaign_brief(brief_path)
         product = brief.get('product', 'unknown_product')
 
-        print(f"\nProduct: {product}")
-        print(f"Target Region: {brief.get('target_region', 'N/A')}")
-        print(f"Target Audience: {brief.get('target_audience', 'N/A')}")
-        print(f"Campaign Message: {brief.get('campaign_message', 'N/A')}")
+        logger.info("\nProduct: %s", product)
+        logger.info("Target Region: %s", brief.get('target_region', 'N/A'))
+        logger.info("Target Audience: %s", brief.get('target_audience', 'N/A'))
+        logger.info("Campaign Message: %s", brief.get('campaign_message', 'N/A'))
 
         results = {}
+        jobs = []
+        existing = self._scan_existing_assets(product) if skip_existing else {}
 
-        # Generate assets for each aspect ratio
+        # Collect variants to generate for each aspect ratio
         for aspect_ratio in self.aspect_ratios.keys():
             display_ratio = self.aspect_ratio_display[aspect_ratio]
-            print(f"\n--- Processing {display_ratio} aspect ratio ---")
+            logger.info("\n--- Processing %s aspect ratio ---", display_ratio)
 
             # Check for existing assets
-            if skip_existing and self.check_existing_assets(product, aspect_ratio):
-                existing_path = self.output_dir / product / aspect_ratio
-                results[display_ratio] = list(existing_path.glob('*.png'))
+            if skip_existing and self.check_existing_assets(product, aspect_ratio, existing):
+                results[display_ratio] = existing[aspect_ratio]
                 continue
 
-            # Generate variants
-            variant_paths = []
+            # Create output directory structure once per aspect ratio
+            (self.output_dir / product / aspect_ratio).mkdir(parents=True, exist_ok=True)
+            results[display_ratio] = []
             for i in range(1, num_variants + 1):
-                try:
-                    path = self.generate_creative_asset(brief, aspect_ratio, i)
-                    variant_paths.append(path)
-                except Exception as e:
-                    print(f"Failed to generate variant {i}: {str(e)}")
+                jobs.append((display_ratio, aspect_ratio, i))
 
-            results[display_ratio] = variant_paths
+        return brief, results, jobs
+
+    def _finish_pipeline(self, brief: Dict, results: Dict[str, List[Path]]) -> None:
+        """Print the campaign message and a summary of generated assets"""
+        product = brief.get('product', 'unknown_product')
 
         # Generate campaign message
-        print("\n--- Campaign Message ---")
+        logger.info("\n--- Campaign Message ---")
         message = self.generate_campaign_message(brief, locale='en')
-        print(f"English: {message}")
+        logger.info("English: %s", message)
 
         # Print summary
-        print("\n" + "="*60)
-        print("Pipeline Complete - Summary")
-        print("="*60)
+        logger.info("\n%s", "=" * 60)
+        logger.info("Pipeline Complete - Summary")
+        logger.info("="*60)
         total_assets = sum(len(paths) for paths in results.values())
-        print(f"Total assets generated: {total_assets}")
+        logger.info("Total assets generated: %d", total_assets)
 
         for ratio, paths in results.items():
-            print(f"  {ratio}: {len(paths)} variants")
+            logger.info("  %s: %d variants", ratio, len(paths))
+
+        logger.info("\nOutput directory: %s", self.output_dir / product)
+        logger.info("="*60)
+
+    async def run_pipeline(
+        self, 
+        brief_path: str, 
+        num_variants: int = 3,
+        skip_existing: bool = True
+    ) -> Dict[str, List[Path]]:
+        """Run complete pipeline for campaign brief"""
+        brief, results, jobs = self._plan_pipeline(brief_path, num_variants, skip_existing)
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        prompt_template = self._prepare_prompt_template(brief)
+
+        if self.derive_crops:
+            # One generation per variant, cropped to every aspect ratio that needs it
+            variants = {}
+            for _, aspect_ratio, i in jobs:
+                variants.setdefault(i, []).append(aspect_ratio)
+
+            outcomes = await asyncio.gather(
+                *(self.generate_cropped_assets(brief, aspect_ratios, i, semaphore, prompt_template)
+                  for i, aspect_ratios in variants.items()),
+                return_exceptions=True
+            )
+
+            for (i, aspect_ratios), outcome in zip(variants.items(), outcomes):
+                for j, aspect_ratio in enumerate(aspect_ratios):
+                    display_ratio = self.aspect_ratio_display[aspect_ratio]
+                    if isinstance(outcome, Exception):
+                        logger.warning("Failed to generate %s variant %d: %s", display_ratio, i, outcome)
+                    else:
+                        results[display_ratio].append(outcome[j])
+        else:
+            # Generate all variants concurrently, bounded by the semaphore
+            outcomes = await asyncio.gather(
+                *(self.generate_creative_asset(brief, aspect_ratio, i, semaphore, prompt_template)
+                  for _, aspect_ratio, i in jobs),
+                return_exceptions=True
+            )
+
+            for (display_ratio, _, i), outcome in zip(jobs, outcomes):
+                if isinstance(outcome, Exception):
+                    logger.warning("Failed to generate %s variant %d: %s", display_ratio, i, outcome)
+                else:
+                    results[display_ratio].append(outcome)
+
+        self._finish_pipeline(brief, results)
+        return results
+
+    async def run_pipeline_batch(
+        self,
+        brief_path: str,
+        num_variants: int = 3,
+        skip_existing: bool = True,
+        poll_interval: float = 30.0
+    ) -> Dict[str, List[Path]]:
+        """Run complete pipeline for campaign brief as a single Gemini batch job"""
+        brief, results, jobs = self._plan_pipeline(brief_path, num_variants, skip_existing)
+        product = brief.get('product', 'unknown_product')
 
-        print(f"\nOutput directory: {self.output_dir / product}")
-        print("="*60)
+        # Resolve cached prompts locally and submit only the rest
+        pending = []
+        cached = []
+        prompt_template = self._prepare_prompt_template(brief)
+        for display_ratio, aspect_ratio, i in jobs:
+            prompt = self.generate_image_prompt(brief, aspect_ratio, i, prompt_template)
+            image_data = self._load_cached_image(prompt, aspect_ratio, i)
+            if image_data is not None:
+                logger.info("✓ Using cached image for %s variant %d", display_ratio, i)
+                cached.append((display_ratio, aspect_ratio, i, prompt, image_data))
+            else:
+                pending.append((display_ratio, aspect_ratio, i, prompt))
 
+        outcomes = await asyncio.gather(
+            *(self.save_asset(image_data, product, aspect_ratio, i)
+              for _, aspect_ratio, i, _, image_data in cached),
+            return_exceptions=True
+        )
+        for (display_ratio, aspect_ratio, i, prompt, _), outcome in zip(cached, outcomes):
+            if isinstance(outcome, Exception):
+                # Unreadable cache entries are dropped and regenerated in the batch
+                logger.warning("Discarding unreadable cached image for %s variant %d: %s",
+                               display_ratio, i, outcome)
+                self._discard_cached_image(prompt, aspect_ratio, i)
+                pending.append((display_ratio, aspect_ratio, i, prompt))
+            else:
+                results[display_ratio].append(outcome)
+
+        if pending:
+            # Build one inline request per variant
+            requests = [
+                {
+                    'contents': [{
+                        'role': 'user',
+                        'parts': [{'text': prompt}]
+                    }],
+                    'config': self._generation_config(aspect_ratio)
+                }
+                for _, aspect_ratio, _, prompt in pending
+            ]
+
+            logger.info("\nSubmitting batch job with %d requests...", len(requests))
+            job = await self.client.aio.batches.create(
+                model=self.model,
+                src=requests,
+                config={'display_name': product}
+            )
+            logger.info("✓ Created batch job: %s", job.name)
+
+            # Poll until the job reaches a terminal state
+            while job.state.name not in BATCH_TERMINAL_STATES:
+                logger.info("  Batch job state: %s", job.state.name)
+                await asyncio.sleep(poll_interval)
+                job = await self.client.aio.batches.get(name=job.name)
+
+            if job.state.name != 'JOB_STATE_SUCCEEDED':
+                raise Exception(f"Batch job {job.name} finished with state {job.state.name}")
+
+            # Inline responses are returned in request order
+            saves = []
+            for (display_ratio, aspect_ratio, i, prompt), inline_response in zip(
+                pending, job.dest.inlined_responses
+            ):
+                try:
+                    if inline_response.error:
+                        raise Exception(str(inline_response.error))
+                    image_data = self.extract_image_data(inline_response.response)
+                    self._store_cached_image(prompt, aspect_ratio, i, image_data)
+                    saves.append(
+                        (display_ratio, i, self.save_asset(image_data, product, aspect_ratio, i))
+                    )
+                except Exception as e:
+                    logger.warning("Failed to generate %s variant %d: %s", display_ratio, i, e)
+            await self._collect_saves(saves, results)
+
+        self._finish_pipeline(brief, results)
         return results
 
 
+def _configure_logging(quiet: bool = False, buffered: bool = True) -> logging.Handler:
+    """Send pipeline logs to stdout, buffering records so concurrent tasks don't contend on it"""
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter('%(message)s'))
+
+    handler = stream_handler
+    if buffered:
+        # Flushes when full, on errors, and when closed at the end of the run
+        handler = logging.handlers.MemoryHandler(
+            capacity=64,
+            flushLevel=logging.ERROR,
+            target=stream_handler
+        )
+
+    logger.addHandler(handler)
+    logger.setLevel(logging.WARNING if quiet else logging.INFO)
+    logger.propagate = False
+    return handler
+
+
 def main():
     """Main entry point for CLI"""
     parser = argparse.ArgumentParser(
@@ -289,19 +862,75 @@ def main():
         choices=['gemini-2.5-flash-image', 'gemini-2.0-flash-exp'],
         help='Model to use for image generation (default: gemini-2.5-flash-image)'
     )
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=4,
+        help='Maximum number of concurrent generation requests (default: 4)'
+    )
+    parser.add_argument(
+        '--batch',
+        action='store_true',
+        help='Submit all variants as one Gemini batch job (cheaper, slower turnaround)'
+    )
+    parser.add_argument(
+        '--format',
+        default='png',
+        choices=sorted(IMAGE_SAVE_OPTIONS),
+        help='Output image format (default: png)'
+    )
+    parser.add_argument(
+        '--crop',
+        action='store_true',
+        help='Generate one square image per variant and center-crop it to every aspect ratio'
+    )
+    parser.add_argument(
+        '--verbose',
+        action='store_true',
+        help='Print any text the model returns alongside images'
+    )
+    parser.add_argument(
+        '--quiet',
+        action='store_true',
+        help='Only report failures'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Neither reuse nor store cached images from previous runs'
+    )
 
     args = parser.parse_args()
+    if args.crop and args.batch:
+        parser.error('--crop cannot be combined with --batch')
+
+    # Batch runs poll for minutes, so show their progress as it happens
+    log_handler = _configure_logging(quiet=args.quiet, buffered=not args.batch)
 
+    pipeline = None
     try:
-        pipeline = CreativeAutomationPipeline(api_key=args.api_key, model=args.model)
-        pipeline.run_pipeline(
+        pipeline = CreativeAutomationPipeline(
+            api_key=args.api_key,
+            model=args.model,
+            max_concurrency=args.concurrency,
+            use_cache=not args.no_cache,
+            image_format=args.format,
+            verbose=args.verbose,
+            derive_crops=args.crop
+        )
+        run = pipeline.run_pipeline_batch if args.batch else pipeline.run_pipeline
+        asyncio.run(run(
             args.brief,
             num_variants=args.variants,
             skip_existing=not args.no_skip
-        )
+        ))
     except Exception as e:
-        print(f"\nError: {str(e)}")
+        logger.error("\nError: %s", e)
         sys.exit(1)
+    finally:
+        if pipeline is not None:
+            pipeline.close()
+        log_handler.close()
 
 
 if __name__ == '__main__':